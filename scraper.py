@@ -2,182 +2,568 @@
 Library Book Scraper
 
 This module provides functionality to scrape book details from a library website
-using Selenium WebDriver. It extracts information such as title, author, 
+over plain HTTP, falling back to Selenium WebDriver when the pages need a browser
+to render. It extracts information such as title, author, 
 publication year, and other metadata from book listings across paginated pages.
 
 The main components of this module are:
+- Concurrent HTTP download of the listing pages with a kept-alive session
 - WebDriver setup for headless Chrome browser
-- Functions to extract text and book details from HTML elements
+- Parsing of each page's source with lxml to extract the details of every book
 - CSV writing capability for storing scraped data
 - Pagination handling to scrape books across multiple pages
+- A pool of worker threads, each with its own WebDriver, to load pages
+  concurrently
 
 Dependencies:
+- requests: For downloading server-rendered listing pages
 - selenium: For web scraping and browser automation
+- lxml, cssselect: For parsing the book details out of the page source
 - csv: For writing scraped data to CSV files
+- concurrent.futures: For the thread pools that load pages concurrently
+- logging: For optionally reporting every scraped book
 
 Usage:
 Run this script directly to start the scraping process. The results will be
-saved in a CSV file named 'scraped_books.csv' in the same directory.
+saved in a CSV file named 'scraped_books.csv' in the same directory. Pass
+--verbose to also log every book to stderr as it is written.
 
-Note: Ensure that the Chrome WebDriver executable (chromedriver) is available
-in the './chromedriver/' directory relative to this script.
+Note: The browser fallback needs the Chrome WebDriver executable (chromedriver)
+in the './chromedriver/' directory relative to this script, unless
+CHROMEDRIVER_URL points at one that is already running.
 
-This version (1.1) includes optimizations for memory efficiency, processing
-books one at a time instead of storing all book details in memory at once.
+This version (1.2) downloads the listing pages concurrently over plain HTTP and
+only starts a browser when the pages need JavaScript to render. Books are
+streamed to the CSV file page by page instead of storing all book details in
+memory at once.
 
 Author: Poon Ho Chuen
 Date: 16 Oct 2024
-Version: 1.1
+Version: 1.2
 """
 
+import argparse
 import csv
-from functools import partial
+import io
+import itertools
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
 
+import lxml.html
+import requests
+from cssselect import GenericTranslator
+from lxml import etree
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    NoSuchElementException,
-    ElementClickInterceptedException,
-    TimeoutException
+from selenium.common.exceptions import WebDriverException
+
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://library.happycoding.hk/books/"
+
+# Number of listing pages requested at the same time when the site can be
+# scraped over plain HTTP, without a browser.
+HTTP_WORKERS = 16
+HTTP_TIMEOUT = 10
+HTTP_RETRIES = Retry(total=3, backoff_factor=0.5,
+                     status_forcelist=(500, 502, 503, 504))
+
+# URL of an already running chromedriver (e.g. one started with
+# `chromedriver --port=9515`). When unset, a chromedriver process is started
+# for every driver from ./chromedriver/.
+CHROMEDRIVER_URL = os.environ.get("CHROMEDRIVER_URL")
+
+# Chrome profiles are kept between runs so the browser's disk cache survives.
+# Every concurrently running driver gets its own numbered profile directory.
+PROFILE_DIR = os.path.abspath("chrome-profile")
+
+# Each worker thread drives its own Chrome instance, so this also bounds the
+# number of browsers running at the same time.
+WORKERS = os.cpu_count() or 1
+
+# Rows are formatted into memory and written to the file in chunks of this size.
+WRITE_BUFFER_SIZE = 1 << 16
+
+# (key, CSS selector, kind) for every book detail, in CSV column order. "text"
+# reads the element's text, "split" the text of the icon's parent after its
+# "Label: " prefix and "bool" whether the element exists.
+SELECTOR_SPEC = (
+    ("title", "h4.text-primary", "text"),
+    ("district", "i.fas.fa-map-marker", "split"),
+    ("author", "i.fa.fa-user", "split"),
+    ("copy_id", "i.fa.fa-clone", "split"),
+    ("publication_year", "i.fa.fa-calendar", "split"),
+    ("publisher", "i.fas.fa-money-bill-alt", "split"),
+    ("call_number", "i.fa.fa-list-ol", "split"),
+    ("edition", "i.fas.fa-clock", "split"),
+    ("new_release", "span.badge.badge-secondary.text-white", "bool"),
 )
+FIELDNAMES = tuple(key for key, _, _ in SELECTOR_SPEC)
+
+# The CSS selectors are translated to compiled XPath expressions once at import,
+# so no selector is re-parsed while the cards are walked.
+_translator = GenericTranslator()
+
+
+def compile_selector(selector, kind):
+    """Compile a SELECTOR_SPEC entry to XPath, stepping up to the icon's parent."""
+    xpath = _translator.css_to_xpath(selector)
+    return etree.XPath(f"{xpath}/.." if kind == "split" else xpath)
+
+
+CARD_XPATH = etree.XPath(_translator.css_to_xpath(".card.listing-preview"))
+COMPILED_SPEC = tuple(
+    (compile_selector(selector, kind), kind)
+    for _, selector, kind in SELECTOR_SPEC
+)
+PAGE_LINK_XPATH = etree.XPath("//a[contains(@href, 'page=')]/@href")
+
+
+def setup_driver(profile=0):
+    """
+    Initialize and return a headless Chrome WebDriver.
 
+    Only the text of the listing pages is scraped, so navigation returns as soon
+    as the DOM is ready and images, stylesheets and fonts are never fetched.
+    If CHROMEDRIVER_URL is set, the session is opened on that chromedriver
+    instead of spawning a new one.
 
-def setup_driver():
-    """Initialize and return a headless Chrome WebDriver."""
+    Parameters:
+        profile: The number of the persistent Chrome profile to use. Drivers
+            running at the same time must use different profiles.
+    """
     options = Options()
     options.add_argument("--headless")
+    options.add_argument(f"--user-data-dir={PROFILE_DIR}/{profile}")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.page_load_strategy = "eager"
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.stylesheets": 2,
+        "profile.managed_default_content_settings.fonts": 2,
+    })
+    if CHROMEDRIVER_URL:
+        return webdriver.Remote(command_executor=CHROMEDRIVER_URL, options=options)
     service = Service("./chromedriver/chromedriver")
     return webdriver.Chrome(service=service, options=options)
 
 
-def extract_text(element, selector, split_delimiter=": "):
+def extract_text(element):
+    """Return the text of an lxml element with its whitespace collapsed."""
+    return " ".join(element.text_content().split())
+
+
+def extract_book_details(card):
     """
-    Extract and split the text from a child element based on a CSS selector.
+    Extract detailed information from a single book card.
 
     Parameters:
-        element: The parent Selenium WebElement.
-        selector: The CSS selector string to locate the child element.
-        split_delimiter: The delimiter to split the text.
+        card: The lxml element of a .card.listing-preview.
 
     Returns:
-        The part of the text after the delimiter or an empty string if not found.
+        A tuple holding the book's details in FIELDNAMES order.
     """
-    try:
-        text = element.find_element(
-            By.CSS_SELECTOR, selector).find_element(By.XPATH, "..").text
-        return text.split(split_delimiter, 1)[-1]
-    except NoSuchElementException:
-        return ""
+    details = []
+    for xpath, kind in COMPILED_SPEC:
+        matches = xpath(card)
+        if kind == "bool":
+            details.append(bool(matches))
+            continue
+        text = extract_text(matches[0]) if matches else ""
+        if kind == "split":
+            text = text.split(": ", 1)[-1]
+        details.append(text)
+    return tuple(details)
 
 
-def extract_book_details(selectors, book):
+def parse_books(tree):
     """
-    Extract detailed information from a single book element.
-    
+    Extract the details of every book on a parsed listing page.
+
+    Parameters:
+        tree: The lxml document of a listing page.
+
+    Returns:
+        A list of tuples, each holding one book's details in FIELDNAMES order.
+    """
+    return [extract_book_details(card) for card in CARD_XPATH(tree)]
+
+
+def count_pages(tree):
+    """Return the number of the last listing page linked from a parsed page."""
+    pages = [
+        int(page)
+        for href in PAGE_LINK_XPATH(tree)
+        for page in parse_qs(urlsplit(href).query).get("page", ())
+        if page.isdigit()
+    ]
+    return max(pages, default=1)
+
+
+def extract_books(driver):
+    """
+    Extract the details of every book on the current page.
+
+    The page source is fetched once and parsed with lxml, so the cost of a
+    page is one WebDriver round trip regardless of the number of books on it.
+
     Parameters:
-        selectors: A dictionary mapping detail keys to CSS selectors.
-        book: The Selenium WebElement representing a book.
+        driver: The Selenium WebDriver with a listing page loaded.
 
     Returns:
-        A dictionary containing the extracted book details.
-    """
-    extract = partial(extract_text, book)
-    details = {
-        key: (book.find_element(By.CSS_SELECTOR, selector).text if key ==
-              "title" else extract(selector))
-        for key, selector in selectors.items()
-        if key != "new_release"
-    }
-    details["new_release"] = bool(book.find_elements(
-        By.CSS_SELECTOR, selectors["new_release"]))
-    return details
-
-
-def fetch_books(driver):
-    """Generator to fetch all book elements across paginated pages."""
+        A list of tuples, each holding one book's details in FIELDNAMES order.
+    """
+    return parse_books(lxml.html.fromstring(driver.page_source))
+
+
+# Returns the URL of the enabled "»" pagination link, or null on the last page.
+NEXT_PAGE_JS = """
+const link = Array.from(document.querySelectorAll("a"))
+    .find((a) => a.textContent.trim() === "»");
+return link && link.href && !link.closest(".disabled") ? link.href : null;
+"""
+
+
+def fetch_books(driver, skipped):
+    """
+    Generator to fetch the details of all books across paginated pages.
+
+    The pages are followed through their "»" links, so a page that fails to
+    load ends the walk; its URL is recorded as skipped.
+
+    Parameters:
+        driver: The Selenium WebDriver with the first listing page loaded.
+        skipped: A list collecting the URL of every page that was skipped.
+    """
     wait = WebDriverWait(driver, 10)
+    wait.until(EC.presence_of_all_elements_located(
+        (By.CSS_SELECTOR, ".card.listing-preview")))
     while True:
-        wait.until(EC.presence_of_all_elements_located(
-            (By.CSS_SELECTOR, ".card.listing-preview")))
-        yield from driver.find_elements(By.CSS_SELECTOR, ".card.listing-preview")
+        yield from extract_books(driver)
 
+        next_url = driver.execute_script(NEXT_PAGE_JS)
+        if not next_url:
+            break
         try:
-            next_button = driver.find_element(
-                By.XPATH, '//a[normalize-space()="»"]')
-            if next_button.is_enabled() and next_button.is_displayed():
-                next_button.click()
-                wait.until(EC.staleness_of(next_button))
-            else:
-                break
-        except (NoSuchElementException, ElementClickInterceptedException, TimeoutException):
+            # Navigating directly lets chromedriver return as soon as the
+            # browser reports the page ready, instead of polling for the
+            # old page to go stale after a click.
+            driver.get(next_url)
+            wait.until(EC.presence_of_all_elements_located(
+                (By.CSS_SELECTOR, ".card.listing-preview")))
+        except WebDriverException as error:
+            logger.warning("Stopping at %s: %s", next_url,
+                           error.msg or "no books found")
+            skipped.append(next_url)
             break
 
 
+_worker = threading.local()
+
+
+def worker_driver(drivers, profiles):
+    """
+    Return the WebDriver of the current pool worker thread, starting it if needed.
+
+    Starting the driver inside the task rather than in a pool initializer means
+    a browser that fails to start raises to the caller of the pool.
+
+    Parameters:
+        drivers: A shared list collecting every worker's driver so the caller
+            can quit them once the pool is done.
+        profiles: An iterator handing out a distinct profile number per worker.
+    """
+    driver = getattr(_worker, "driver", None)
+    if driver is None:
+        driver = _worker.driver = setup_driver(next(profiles))
+        drivers.append(driver)
+    return driver
+
+
+def page_url(page):
+    """Return the URL of a listing page."""
+    return f"{BASE_URL}?page={page}"
+
+
+def scrape_page(page, drivers, profiles):
+    """
+    Load a single listing page in the worker's WebDriver and extract its books.
+
+    Parameters:
+        page: The number of the listing page to scrape.
+        drivers: The shared list of worker drivers, see worker_driver.
+        profiles: The shared profile number iterator, see worker_driver.
+
+    Returns:
+        A list of tuples, each holding one book's details in FIELDNAMES order,
+        or None if the page failed to load or no books appeared on it.
+    """
+    driver = worker_driver(drivers, profiles)
+    try:
+        driver.get(page_url(page))
+        WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located(
+            (By.CSS_SELECTOR, ".card.listing-preview")))
+        return extract_books(driver)
+    except WebDriverException as error:
+        logger.warning("Skipping page %d: %s", page, error.msg or "no books found")
+        return None
+
+
+def fetch_books_parallel(driver, workers, skipped):
+    """
+    Generator to fetch the details of all books, loading pages concurrently.
+
+    The first page is scraped with the given driver to discover the number of
+    pages; the remaining pages are handed to a pool of worker threads, each
+    with its own WebDriver. A thread spends nearly all of its time waiting on
+    its browser, so the pages load concurrently within this one process.
+    Results are yielded in page order as they arrive.
+
+    Parameters:
+        driver: The Selenium WebDriver with the first listing page loaded.
+        workers: The maximum number of worker threads to start.
+        skipped: A list collecting the URL of every page that was skipped.
+    """
+    WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located(
+        (By.CSS_SELECTOR, ".card.listing-preview")))
+    tree = lxml.html.fromstring(driver.page_source)
+    yield from parse_books(tree)
+
+    last_page = count_pages(tree)
+    if last_page < 2:
+        return
+
+    drivers = []
+    profiles = itertools.count(1)
+    pages = range(2, last_page + 1)
+    executor = ThreadPoolExecutor(max_workers=min(workers, last_page - 1))
+    try:
+        results = executor.map(scrape_page, pages, itertools.repeat(drivers),
+                               itertools.repeat(profiles))
+        for page, books in zip(pages, results):
+            if books is None:
+                skipped.append(page_url(page))
+            else:
+                yield from books
+    finally:
+        executor.shutdown(cancel_futures=True)
+        for page_driver in drivers:
+            page_driver.quit()
+
+
+def setup_session():
+    """
+    Return an HTTP session keeping a connection alive for every page worker.
+
+    Connection errors and server errors are retried with a short backoff.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_WORKERS,
+                          max_retries=HTTP_RETRIES)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch_page(session, page):
+    """
+    Download a single listing page over HTTP and parse it.
+
+    Parameters:
+        session: The requests Session to download the page with.
+        page: The number of the listing page to download.
+
+    Returns:
+        The lxml document of the page.
+    """
+    response = session.get(BASE_URL, params={"page": page}, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    # libxml2 only sees the bytes, so pass on a charset declared in the
+    # Content-Type header; otherwise it falls back to the page's <meta charset>.
+    parser = None
+    if "charset=" in response.headers.get("Content-Type", "").lower():
+        parser = lxml.html.HTMLParser(encoding=response.encoding)
+    return lxml.html.fromstring(response.content, parser=parser)
+
+
+def probe_first_page(session):
+    """
+    Fetch the first listing page over HTTP if it is rendered by the server.
+
+    Parameters:
+        session: The requests Session to download the page with.
+
+    Returns:
+        The lxml document of the first page, or None if it could not be
+        downloaded or holds no book cards and a browser is needed.
+    """
+    try:
+        tree = fetch_page(session, 1)
+    except requests.RequestException as error:
+        logger.warning("Falling back to the browser: %s", error)
+        return None
+    return tree if CARD_XPATH(tree) else None
+
+
+def scrape_http_page(session, page):
+    """
+    Download a single listing page over HTTP and extract its books.
+
+    Parameters:
+        session: The requests Session to download the page with.
+        page: The number of the listing page to scrape.
+
+    Returns:
+        A list of tuples, each holding one book's details in FIELDNAMES order,
+        or None if the page could not be downloaded.
+    """
+    try:
+        tree = fetch_page(session, page)
+    except requests.RequestException as error:
+        logger.warning("Skipping page %d: %s", page, error)
+        return None
+    return parse_books(tree)
+
+
+def fetch_books_http(session, first_page, skipped):
+    """
+    Generator to fetch the details of all books over plain HTTP.
+
+    The remaining pages are downloaded and parsed concurrently by a thread pool
+    sharing the session's kept-alive connections. Results are yielded in page
+    order; a page that still fails after retrying is logged and skipped.
+
+    Parameters:
+        session: The requests Session to download the pages with.
+        first_page: The lxml document of the first listing page.
+        skipped: A list collecting the URL of every page that was skipped.
+    """
+    yield from parse_books(first_page)
+
+    last_page = count_pages(first_page)
+    if last_page < 2:
+        return
+
+    pages = range(2, last_page + 1)
+    with ThreadPoolExecutor(max_workers=HTTP_WORKERS) as executor:
+        results = executor.map(scrape_http_page, itertools.repeat(session), pages)
+        for page, books in zip(pages, results):
+            if books is None:
+                skipped.append(page_url(page))
+            else:
+                yield from books
+
+
+def fetch_books_browser(skipped):
+    """
+    Generator to fetch the details of all books with Selenium WebDriver.
+
+    Used when the listing pages are rendered by JavaScript. Pages are loaded
+    concurrently in worker threads when more than one is allowed.
+
+    Parameters:
+        skipped: A list collecting the URL of every page that was skipped.
+    """
+    driver = setup_driver()
+    try:
+        driver.get(BASE_URL)
+        if WORKERS > 1:
+            yield from fetch_books_parallel(driver, WORKERS, skipped)
+        else:
+            yield from fetch_books(driver, skipped)
+    finally:
+        driver.quit()
+
+
 def write_books_to_csv(filename, fieldnames, books):
     """
     Write book details to a CSV file and return the count of books written.
 
+    Rows are formatted into an in-memory buffer that is written to the file
+    whenever it grows past WRITE_BUFFER_SIZE, so the file sees one write per
+    chunk rather than per book and memory use stays bounded.
+
     Parameters:
         filename: The name of the CSV file to write to.
         fieldnames: A list of field names for the CSV header.
-        books: An iterable of dictionaries containing book details.
+        books: An iterable of rows of book details in fieldnames order.
 
     Returns:
         The number of books written to the CSV file.
     """
     count = 0
+    log_books = logger.isEnabledFor(logging.DEBUG)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fieldnames)
     with open(filename, mode='w', newline='', encoding='utf-8') as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        writer.writeheader()
         for book in books:
-            print(book)
+            if log_books:
+                logger.debug("%s", book)
             writer.writerow(book)
             count += 1
+            if buffer.tell() > WRITE_BUFFER_SIZE:
+                csv_file.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+        csv_file.write(buffer.getvalue())
     return count
 
 
+def parse_args():
+    """Parse and return the command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Scrape book details from the library website into a CSV file.")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="log every book as it is written")
+    return parser.parse_args()
+
+
 def main():
     """
     Main function to orchestrate the scraping process.
     
-    This function sets up the WebDriver, defines the CSS selectors for book details,
-    fetches books from the website, extracts their details, and writes them to a CSV file.
-    It uses a memory-efficient approach by processing books one at a time.
+    This function fetches books from the website, extracts their details, and
+    writes them to a CSV file. Pages are downloaded over plain HTTP when the
+    site renders them on the server; otherwise it falls back to a WebDriver.
+    It uses a memory-efficient approach by processing books one page at a time.
+
+    Returns:
+        The exit status: 1 if any page had to be skipped, so the CSV file is
+        incomplete, otherwise 0.
     """
-    driver = setup_driver()
-    driver.get("https://library.happycoding.hk/books/")
-
-    selectors = {
-        "title": "h4.text-primary",
-        "district": "i.fas.fa-map-marker",
-        "author": "i.fa.fa-user",
-        "copy_id": "i.fa.fa-clone",
-        "publication_year": "i.fa.fa-calendar",
-        "publisher": "i.fas.fa-money-bill-alt",
-        "call_number": "i.fa.fa-list-ol",
-        "edition": "i.fas.fa-clock",
-        "new_release": "span.badge.badge-secondary.text-white"
-    }
+    args = parse_args()
+    logging.basicConfig(format="%(message)s")
+    logger.setLevel(logging.DEBUG if args.verbose else logging.WARNING)
 
-    try:
-        book_elements = fetch_books(driver)
-        extract_details = partial(extract_book_details, selectors)
-        book_details = map(extract_details, book_elements)
-        fieldnames = [
-            "title", "district", "author", "copy_id",
-            "publication_year", "publisher", "call_number",
-            "edition", "new_release"
-        ]
+    skipped = []
+    with setup_session() as session:
+        first_page = probe_first_page(session)
+        if first_page is not None:
+            book_details = fetch_books_http(session, first_page, skipped)
+        else:
+            book_details = fetch_books_browser(skipped)
         count = write_books_to_csv(
-            "scraped_books.csv", fieldnames, book_details)
-        print(f"Total books scraped: {count}")
-    finally:
-        driver.quit()
+            "scraped_books.csv", FIELDNAMES, book_details)
+    print(f"Total books scraped: {count}")
+    if skipped:
+        logger.error("Pages skipped: %d, scraped_books.csv is incomplete: %s",
+                     len(skipped), ", ".join(skipped))
+        return 1
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import sys
+
+import lxml.html
+import pytest
+import requests
+from selenium.common.exceptions import WebDriverException
+
+import scraper
+
+
+LISTING_HTML = """
+<html><body>
+  <div class="col-md-6 col-lg-4 mb-4">
+    <div class="card listing-preview">
+      <div class="card-body">
+        <div class="listing-heading text-center">
+          <h4 class="text-primary">This is not my pizza!</h4>
+        </div>
+        <hr>
+        <div class="row py-2 text-secondary">
+          <div class="col-6">
+            <p><i class="fas fa-map-marker"></i> District: Central</p>
+          </div>
+          <div class="col-6">
+            <p><i class="fa fa-user"></i> Author: Hawes, Alison.</p>
+          </div>
+        </div>
+        <div class="row py-2 text-secondary">
+          <div class="col-6">
+            <p><i class="fa fa-clone"></i> Copy ID: 1</p>
+          </div>
+          <div class="col-6">
+            <p><i class="fa fa-calendar"></i> Publication Year: 1985</p>
+          </div>
+        </div>
+        <div class="row py-2 text-secondary">
+          <div class="col-6">
+            <p><i class="fas fa-money-bill-alt"></i> Publisher: Oxford University Press</p>
+          </div>
+          <div class="col-6">
+            <p><i class="fa fa-list-ol"></i> Call Number: 421.5 HAW</p>
+          </div>
+        </div>
+        <div class="row text-secondary pb-2">
+          <div class="col-6">
+            <p><i class="fas fa-clock"></i> Edition: None</p>
+          </div>
+          <div class="col-6">
+            <span class="badge badge-secondary text-white">New Release</span>
+          </div>
+        </div>
+      </div>
+    </div>
+  </div>
+  <ul class="pagination">
+    <li class="page-item"><a class="page-link" href="?page=2">2</a></li>
+    <li class="page-item"><a class="page-link" href="?page=3">&raquo;</a></li>
+  </ul>
+</body></html>
+"""
+
+
+class StubSession:
+    """A requests Session stand-in serving the same page for every request."""
+
+    def __init__(self, failures=(), html=LISTING_HTML, encoding="utf-8",
+                 content_type="text/html"):
+        self.failures = failures
+        self.content = html.encode(encoding)
+        self.content_type = content_type
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def get(self, url, params, timeout):
+        page = params["page"]
+        if page in self.failures:
+            raise requests.ConnectionError(f"page {page} unreachable")
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = self.content_type
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = self.content
+        return response
+
+
+class StubDriver:
+    """A WebDriver stand-in that has LISTING_HTML loaded."""
+
+    page_source = LISTING_HTML
+
+    def find_elements(self, by, value):
+        return [object()]
+
+
+class BrokenDriver(StubDriver):
+    """A WebDriver stand-in whose browser fails to load any page."""
+
+    def get(self, url):
+        raise WebDriverException("net::ERR_CONNECTION_RESET")
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def listing_page():
+    """A listing page holding one book card in the library site's markup."""
+    return lxml.html.fromstring(LISTING_HTML)
+
+
+def test_parse_books_reads_every_field(listing_page):
+    assert scraper.parse_books(listing_page) == [(
+        "This is not my pizza!", "Central", "Hawes, Alison.", "1", "1985",
+        "Oxford University Press", "421.5 HAW", "None", True,
+    )]
+
+
+def test_count_pages_reads_last_page_link(listing_page):
+    assert scraper.count_pages(listing_page) == 3
+
+
+def test_fetch_books_http_reports_skipped_pages(listing_page):
+    skipped = []
+    books = list(scraper.fetch_books_http(
+        StubSession(failures={3}), listing_page, skipped))
+    assert len(books) == 2
+    assert skipped == [scraper.page_url(3)]
+
+
+def test_probe_first_page_falls_back_on_connection_error():
+    assert scraper.probe_first_page(StubSession(failures={1})) is None
+
+
+def test_fetch_books_parallel_raises_when_a_driver_cannot_start(monkeypatch):
+    def fail_to_start(profile):
+        raise RuntimeError("Chrome failed to start")
+
+    monkeypatch.setattr(scraper, "setup_driver", fail_to_start)
+    with pytest.raises(RuntimeError):
+        list(scraper.fetch_books_parallel(StubDriver(), workers=2, skipped=[]))
+
+
+def test_fetch_page_decodes_with_header_charset():
+    html = LISTING_HTML.replace("This is not my pizza!", "找尋自己的聲音 café")
+    session = StubSession(html=html, content_type="text/html; charset=utf-8")
+    tree = scraper.fetch_page(session, 1)
+    assert scraper.parse_books(tree)[0][0] == "找尋自己的聲音 café"
+
+
+def test_main_exits_non_zero_when_pages_are_skipped(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["scraper.py"])
+    monkeypatch.setattr(scraper, "setup_session",
+                        lambda: StubSession(failures={3}))
+    assert scraper.main() == 1
+    assert len((tmp_path / "scraped_books.csv").read_text().splitlines()) == 3
+
+
+def test_fetch_books_parallel_reports_pages_that_fail_to_load(monkeypatch):
+    monkeypatch.setattr(scraper, "setup_driver", lambda profile: BrokenDriver())
+    skipped = []
+    books = list(scraper.fetch_books_parallel(StubDriver(), 2, skipped))
+    assert len(books) == 1
+    assert skipped == [scraper.page_url(2), scraper.page_url(3)]